@@ -1,29 +1,58 @@
 import sys
 import os
 import logging
+import logging.handlers
+import queue
+import atexit
 import subprocess
 import threading
-import psutil
+import functools
+import time
 import traceback
 import signal
+import faulthandler
 
 try:
     from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QMainWindow, QTextEdit, QVBoxLayout, QWidget, QTabWidget, QLabel, QPushButton, QHBoxLayout
     from PyQt5.QtGui import QIcon, QTextCursor, QMouseEvent
-    from PyQt5.QtCore import Qt, pyqtSignal, QObject, QTimer, QPoint
+    from PyQt5.QtCore import Qt, pyqtSignal, QObject, QTimer
 except ImportError as e:
     print(e)
     sys.exit(1)
 
-# 配置日志
+# 配置日志：产生日志的线程只负责入队，由监听线程统一写控制台和文件
+# 入队时只格式化消息本身，时间和级别由控制台和文件处理器添加，界面中的日志保持原样
+log_queue = queue.Queue(-1)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('tray_gui.log', encoding='utf-8')
-    ]
+    handlers=[queue_handler]
 )
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(log_formatter)
+file_handler = logging.FileHandler('tray_gui.log', encoding='utf-8')
+file_handler.setFormatter(log_formatter)
+log_listener = logging.handlers.QueueListener(
+    log_queue,
+    stream_handler,
+    file_handler,
+    respect_handler_level=True
+)
+log_listener.start()
+# 任何退出路径都要刷出队列中剩余的日志；atexit在非守护线程结束后才执行，只停止一次
+atexit.register(log_listener.stop)
+
+# 子进程输出已显示在界面中，默认不再重复写入日志文件；需要排查时可调低级别
+_CLIENT_LOGGER = logging.getLogger('client')
+_CLIENT_LOGGER.setLevel(logging.WARNING)
+_SERVER_LOGGER = logging.getLogger('server')
+_SERVER_LOGGER.setLevel(logging.WARNING)
+PROCESS_LOGGERS = {
+    'client': (_CLIENT_LOGGER, '[Client]'),
+    'server': (_SERVER_LOGGER, '[Core Server]'),
+}
 
 # 设置未捕获异常处理器
 def handle_exception(exc_type, exc_value, exc_traceback):
@@ -32,60 +61,202 @@ def handle_exception(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = handle_exception
 
+# 致命错误（包括SIGABRT）由faulthandler在C层直接输出所有线程的堆栈，崩溃现场不再分配Python对象
+# 无控制台打包时sys.stderr为None，改为写入单独的文件
+_fault_file = sys.stderr if sys.stderr is not None else open('tray_gui_fault.log', 'a', encoding='utf-8')
+faulthandler.enable(file=_fault_file, all_threads=True)
+
 # 设置信号处理器
 def signal_handler(signum, frame):
     logging.error(f"收到信号 {signum}，程序即将退出")
-    logging.error(f"堆栈跟踪:\n{''.join(traceback.format_stack(frame))}")
+    faulthandler.dump_traceback(file=_fault_file, all_threads=True)
     sys.exit(1)
 
 signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGABRT, signal_handler)
+
+# 日志控件刷新间隔（毫秒），期间到达的日志合并为一次写入
+LOG_FLUSH_INTERVAL = 80
+# 日志控件最多保留的行数，超出后丢弃最早的行
+LOG_MAX_BLOCKS = 5000
+# 子进程输出管道每次读取的字节数
+PIPE_READ_SIZE = 65536
+# 子进程退出后等待读取线程发出剩余输出的最长时间（秒）
+EXIT_DRAIN_TIMEOUT = 1
+
+# 界面样式表，在 QApplication 上统一设置一次，子控件按类型和对象名匹配
+# 同等优先级的规则后者生效，QMenu 等具体类型须写在通用的 QWidget 规则之后
+_APP_QSS = """
+    QMainWindow, QWidget {
+        background-color: #121212;
+        color: #e0e0e0;
+    }
+    QMainWindow::title {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+    }
+    QMainWindow::titlebar {
+        background-color: #1e1e1e;
+    }
+    QMainWindow::titlebar-button {
+        background-color: #2d2d2d;
+        border: none;
+        padding: 2px;
+        margin: 2px;
+    }
+    QMainWindow::titlebar-button:hover {
+        background-color: #404040;
+    }
+    QMainWindow::titlebar-close-button,
+    QMainWindow::titlebar-normal-button,
+    QMainWindow::titlebar-min-button,
+    QMainWindow::titlebar-max-button {
+        background-color: #2d2d2d;
+    }
+    QMainWindow::titlebar-close-button:hover,
+    QMainWindow::titlebar-normal-button:hover,
+    QMainWindow::titlebar-min-button:hover,
+    QMainWindow::titlebar-max-button:hover {
+        background-color: #404040;
+    }
+    QTextEdit {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border: 1px solid #333;
+    }
+    QTabWidget::pane {
+        border: 1px solid #333;
+        background-color: #1e1e1e;
+    }
+    QTabWidget::tab-bar {
+        left: 5px;
+    }
+    QTabBar::tab {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        padding: 8px 12px;
+        margin-right: 2px;
+        border: 1px solid #333;
+        border-bottom: none;
+        border-top-left-radius: 4px;
+        border-top-right-radius: 4px;
+    }
+    QTabBar::tab:selected {
+        background-color: #2d2d2d;
+        border-bottom: none;
+    }
+    QTabBar::tab:!selected {
+        margin-top: 2px;
+    }
+    QApplication {
+        background-color: #121212;
+        color: #e0e0e0;
+    }
+    QMenu {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border: 1px solid #333;
+    }
+    QMenu::item:selected {
+        background-color: #333;
+    }
+    QAction {
+        color: #e0e0e0;
+    }
+"""
+
+_TITLEBAR_QSS = """
+    QWidget#title_bar, #title_bar QWidget {
+        background-color: #1e1e1e;
+        border-top-left-radius: 4px;
+        border-top-right-radius: 4px;
+    }
+    #title_bar QLabel {
+        color: #e0e0e0;
+        font-size: 12px;
+    }
+    #title_bar QPushButton {
+        background-color: transparent;
+        border: none;
+        color: #e0e0e0;
+        padding: 4px 8px;
+        font-family: "Segoe MDL2 Assets";
+        font-size: 10px;
+    }
+    #title_bar QPushButton:hover {
+        background-color: #404040;
+    }
+    #title_bar QPushButton#close_button:hover {
+        background-color: #c42b1c;
+    }
+"""
+
+_CONTENT_QSS = """
+    QWidget#content_widget, #content_widget QWidget {
+        background-color: #121212;
+        border: 1px solid #333;
+        border-top: none;
+    }
+"""
 
 # 获取程序运行目录
 BASE_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+SERVER_EXE = os.path.join(BASE_DIR, "start_server.exe")
+CLIENT_EXE = os.path.join(BASE_DIR, "start_client.exe")
+# 图标文件的候选位置，按优先级排列：PyInstaller资源目录、程序所在目录、当前工作目录
+_ICON_CANDIDATES = tuple(dict.fromkeys(
+    ([os.path.join(sys._MEIPASS, "assets", "icon.ico")] if getattr(sys, 'frozen', False) else [])
+    + [os.path.join(BASE_DIR, "assets", "icon.ico"), os.path.join(os.getcwd(), "assets", "icon.ico")]
+))
+
+@functools.lru_cache(maxsize=1)
 def get_icon_path():
+    for icon_path in _ICON_CANDIDATES:
+        if os.path.exists(icon_path):
+            if icon_path != _ICON_CANDIDATES[0]:
+                logging.info(f"使用备选图标路径：{icon_path}")
+            return icon_path
+    logging.error(f"图标文件不存在：{_ICON_CANDIDATES[0]}")
+    logging.warning("无法找到图标文件，将使用空图标继续运行")
+    return None
+
+def kill_orphan_servers():
+    # 一次性结束所有残留的 start_server.exe 进程及其子进程
     try:
-        # 首先尝试从PyInstaller打包后的资源目录加载
-        if getattr(sys, 'frozen', False):
-            icon_path = os.path.join(sys._MEIPASS, "assets", "icon.ico")
-            if not os.path.exists(icon_path):
-                # 如果在MEIPASS中找不到，尝试在程序所在目录查找
-                icon_path = os.path.join(BASE_DIR, "assets", "icon.ico")
-        else:
-            # 开发环境下从当前目录加载
-            icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "icon.ico")
-        
-        if not os.path.exists(icon_path):
-            logging.error(f"图标文件不存在：{icon_path}")
-            # 尝试在其他可能的位置查找图标
-            alt_paths = [
-                os.path.join(os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__)), "assets", "icon.ico"),
-                os.path.join(os.getcwd(), "assets", "icon.ico")
-            ]
-            for alt_path in alt_paths:
-                if os.path.exists(alt_path):
-                    logging.info(f"使用备选图标路径：{alt_path}")
-                    return alt_path
-            logging.warning("无法找到图标文件，将使用空图标继续运行")
-            return None
-        return icon_path
+        result = subprocess.run(
+            ['taskkill', '/F', '/IM', 'start_server.exe', '/T'],
+            creationflags=subprocess.CREATE_NO_WINDOW,
+            capture_output=True
+        )
+        if result.returncode == 0:
+            logging.info("已终止残留的start_server.exe进程")
     except Exception as e:
-        logging.error(f"获取图标路径时出错：{str(e)}")
-        return None
+        logging.warning(f"清理start_server.exe进程时出错: {str(e)}")
+
+def shutdown_processes(processes):
+    # 等待子进程退出，超时则强制结束，最后清理残留进程
+    for name, process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        except Exception as e:
+            logging.error(f"终止{name}进程时出错：{str(e)}")
+    
+    # 兜底清理仍然残留的start_server.exe进程
+    kill_orphan_servers()
 
 class LogHandler(logging.Handler):
-    def __init__(self, text_widget):
+    # 运行在日志监听线程中，通过信号把日志交给界面线程，不直接操作控件
+    def __init__(self, emitter):
         super().__init__()
-        self.text_widget = text_widget
+        self.emitter = emitter
     
     def emit(self, record):
         try:
-            msg = self.format(record)
-            if hasattr(self.text_widget, 'append'):
-                self.text_widget.append(msg)
+            self.emitter.emit_log(self.format(record))
         except RuntimeError:
-            # Widget was deleted, remove this handler
-            logging.getLogger().removeHandler(self)
+            # Emitter was deleted, remove this handler
+            log_listener.handlers = tuple(h for h in log_listener.handlers if h is not self)
 
 class LogEmitter(QObject):
     log_signal = pyqtSignal(str)  # 修改为只传递字符串
@@ -96,7 +267,66 @@ class LogEmitter(QObject):
     def emit_log(self, message):
         self.log_signal.emit(str(message))  # 确保传递的是字符串
 
+class Throttler(QObject):
+    # 限制函数的调用频率：timeout 毫秒内最多执行一次，期间多余的调用合并为最后一次
+    def __init__(self, func, timeout, parent=None):
+        super().__init__(parent)
+        self._func = func
+        self._timeout = timeout
+        self._args = ()
+        self._last_call = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._fire)
+    
+    def __call__(self, *args):
+        self._args = args
+        if self._timer.isActive():
+            return
+        remaining = self._timeout - (time.monotonic() - self._last_call) * 1000
+        if remaining <= 0:
+            self._fire()
+        else:
+            self._timer.start(int(remaining))
+    
+    def _fire(self):
+        self._last_call = time.monotonic()
+        self._func(*self._args)
+
+def read_output(stream, emitter, logger, prefix):
+    # 按块读取原始字节，每块完整的行只解码一次并作为一条多行消息发出，
+    # 减少系统调用、逐行解码和跨线程信号的次数；未结束的行留到下一块
+    # 与通用换行模式一致，\r、\n、\r\n 都算行尾，转录进度这类以 \r 结尾的输出可以及时显示
+    fd = stream.fileno()
+    buf = b''
+    skip_lf = False  # 上一块以 \r 结尾时，本块开头的 \n 与它同属一个 \r\n
+    while True:
+        chunk = os.read(fd, PIPE_READ_SIZE)
+        if not chunk:
+            break
+        if skip_lf and chunk.startswith(b'\n'):
+            chunk = chunk[1:]
+        skip_lf = False
+        data = buf + chunk
+        end = max(data.rfind(b'\r'), data.rfind(b'\n'))
+        if end < 0:
+            buf = data
+            continue
+        head, buf = data[:end], data[end + 1:]
+        if data[end:end + 1] == b'\n' and head.endswith(b'\r'):
+            head = head[:-1]
+        skip_lf = data[end:end + 1] == b'\r' and not buf
+        text = head.decode('utf-8', 'replace').replace('\r\n', '\n').replace('\r', '\n')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s %s', prefix, text)
+        emitter.emit_log(text)
+    if buf:
+        emitter.emit_log(buf.decode('utf-8', 'replace'))
+    stream.close()
+
 class MainWindow(QMainWindow):
+    process_exited = pyqtSignal(str, int)  # 进程标签，退出码
+
     def __init__(self):
         super().__init__()
         # 设置无边框窗口
@@ -109,82 +339,19 @@ class MainWindow(QMainWindow):
         palette.setColor(palette.WindowText, Qt.GlobalColor.white)
         self.setPalette(palette)
         
-        # 用于窗口拖动的变量
-        self._drag_pos = None
+        # 用于窗口拖动的变量：按下时鼠标相对窗口左上角的偏移
+        self._drag_x = None
+        self._drag_y = None
+        # 拖动时移动窗口限制为约60帧每秒
+        self._move_throttled = Throttler(self.move, 16, self)
                 
-        # 初始化进程监控定时器
-        self.process_monitor = QTimer()
-        self.process_monitor.timeout.connect(self.check_processes)
-        self.process_monitor.start(1000)  # 每秒检查一次进程状态
-        
-        # 设置暗色主题样式
-        self.setStyleSheet("""
-            QMainWindow, QWidget {
-                background-color: #121212;
-                color: #e0e0e0;
-            }
-            QMainWindow::title {
-                background-color: #1e1e1e;
-                color: #e0e0e0;
-            }
-            QMainWindow::titlebar {
-                background-color: #1e1e1e;
-            }
-            QMainWindow::titlebar-button {
-                background-color: #2d2d2d;
-                border: none;
-                padding: 2px;
-                margin: 2px;
-            }
-            QMainWindow::titlebar-button:hover {
-                background-color: #404040;
-            }
-            QMainWindow::titlebar-close-button,
-            QMainWindow::titlebar-normal-button,
-            QMainWindow::titlebar-min-button,
-            QMainWindow::titlebar-max-button {
-                background-color: #2d2d2d;
-            }
-            QMainWindow::titlebar-close-button:hover,
-            QMainWindow::titlebar-normal-button:hover,
-            QMainWindow::titlebar-min-button:hover,
-            QMainWindow::titlebar-max-button:hover {
-                background-color: #404040;
-            }
-            QTextEdit {
-                background-color: #1e1e1e;
-                color: #e0e0e0;
-                border: 1px solid #333;
-            }
-            QTabWidget::pane {
-                border: 1px solid #333;
-                background-color: #1e1e1e;
-            }
-            QTabWidget::tab-bar {
-                left: 5px;
-            }
-            QTabBar::tab {
-                background-color: #1e1e1e;
-                color: #e0e0e0;
-                padding: 8px 12px;
-                margin-right: 2px;
-                border: 1px solid #333;
-                border-bottom: none;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-            }
-            QTabBar::tab:selected {
-                background-color: #2d2d2d;
-                border-bottom: none;
-            }
-            QTabBar::tab:!selected {
-                margin-top: 2px;
-            }
-        """)
+        # 子进程退出时由等待线程发出信号，无需定时轮询
+        self.process_exited.connect(self.on_process_exited)
         
         self.log_emitter = LogEmitter()
         self.server_process = None
         self.client_process = None
+        self._client_started = False
         self.server_emitter = LogEmitter()
         self.client_emitter = LogEmitter()
         self.setWindowTitle("CapsWriter-Offline")
@@ -200,27 +367,7 @@ class MainWindow(QMainWindow):
         # 创建自定义标题栏
         title_bar = QWidget()
         title_bar.setFixedHeight(32)
-        title_bar.setStyleSheet("""
-            QWidget {
-                background-color: #1e1e1e;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-            }
-            QPushButton {
-                background-color: transparent;
-                border: none;
-                color: #e0e0e0;
-                padding: 4px 8px;
-                font-family: "Segoe MDL2 Assets";
-                font-size: 10px;
-            }
-            QPushButton:hover {
-                background-color: #404040;
-            }
-            QPushButton#close_button:hover {
-                background-color: #c42b1c;
-            }
-        """)
+        title_bar.setObjectName("title_bar")
         
         title_layout = QHBoxLayout(title_bar)
         title_layout.setContentsMargins(8, 0, 0, 0)
@@ -228,7 +375,6 @@ class MainWindow(QMainWindow):
         
         # 标题文本
         title_label = QLabel("CapsWriter-Offline")
-        title_label.setStyleSheet("color: #e0e0e0; font-size: 12px;")
         title_layout.addWidget(title_label)
         title_layout.addStretch()
         
@@ -251,13 +397,7 @@ class MainWindow(QMainWindow):
         content_widget = QWidget()
         content_layout = QVBoxLayout(content_widget)
         content_layout.setContentsMargins(1, 0, 1, 1)  # 添加边框效果
-        content_widget.setStyleSheet("""
-            QWidget {
-                background-color: #121212;
-                border: 1px solid #333;
-                border-top: none;
-            }
-        """)
+        content_widget.setObjectName("content_widget")
         layout.addWidget(content_widget)
         
         # 创建标签页
@@ -266,6 +406,10 @@ class MainWindow(QMainWindow):
         self.server_log.setReadOnly(True)
         self.client_log = QTextEdit()
         self.client_log.setReadOnly(True)
+        # 限制日志行数并关闭撤销记录，长时间运行后追加日志的开销不再随文档增长
+        for text_widget in (self.server_log, self.client_log):
+            text_widget.document().setMaximumBlockCount(LOG_MAX_BLOCKS)
+            text_widget.setUndoRedoEnabled(False)
         
         self.tab_widget.addTab(self.server_log, "服务端日志")
         self.tab_widget.addTab(self.client_log, "客户端日志")
@@ -277,89 +421,106 @@ class MainWindow(QMainWindow):
         self.server_emitter.log_signal.connect(self.append_server_log)
         self.client_emitter.log_signal.connect(self.append_client_log)
         
+        # 程序自身的日志也显示在客户端日志页，由监听线程经信号转发
+        self.log_emitter.log_signal.connect(self.append_client_log)
+        log_listener.handlers += (LogHandler(self.log_emitter),)
+        
+        # 日志缓冲区，合并一段时间内的多行日志后一次性写入控件
+        self._server_buf = []
+        self._server_flush_pending = False
+        self._client_buf = []
+        self._client_flush_pending = False
+        
+        # 滚动到末尾会触发整篇文档布局，限制为每 100 毫秒最多一次
+        self._scroll_server_end = Throttler(lambda: self.server_log.moveCursor(QTextCursor.End), 100, self)
+        self._scroll_client_end = Throttler(lambda: self.client_log.moveCursor(QTextCursor.End), 100, self)
+        
         # 添加初始等待提示
         self.client_log.append("正在等待服务端启动...")
         self.client_log.append("请耐心等待，首次加载可能需要较长时间")
         self.client_log.moveCursor(QTextCursor.End)
     def append_server_log(self, message):
-        self.server_log.append(message)
-        self.server_log.moveCursor(QTextCursor.End)
-        if "------------------------ 开始服务 ----------" in message:
+        self._server_buf.append(message)
+        if not self._server_flush_pending:
+            self._server_flush_pending = True
+            QTimer.singleShot(LOG_FLUSH_INTERVAL, self._flush_server)
+        # 服务端就绪后只启动一次客户端，之后每行日志只需判断一个布尔值
+        if not self._client_started and message.find('开始服务') >= 0:
+            self._client_started = True
             self.start_client()
             
     def append_client_log(self, message):
-        self.client_log.append(message)
-        self.client_log.moveCursor(QTextCursor.End)
+        self._client_buf.append(message)
+        if not self._client_flush_pending:
+            self._client_flush_pending = True
+            QTimer.singleShot(LOG_FLUSH_INTERVAL, self._flush_client)
+    
+    def _flush_server(self):
+        self.server_log.append('\n'.join(self._server_buf))
+        self._server_buf.clear()
+        self._server_flush_pending = False
+        self._scroll_server_end()
+    
+    def _flush_client(self):
+        self.client_log.append('\n'.join(self._client_buf))
+        self._client_buf.clear()
+        self._client_flush_pending = False
+        self._scroll_client_end()
         
     def start_client(self):
         # 启动客户端进程
         env = os.environ.copy()
         env['PYTHONIOENCODING'] = 'utf8'
         self.client_process = subprocess.Popen(
-            [os.path.join(BASE_DIR, "start_client.exe")],
+            [CLIENT_EXE],
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
+            stderr=subprocess.STDOUT,
             creationflags=subprocess.CREATE_NO_WINDOW,
-            env=env,
-            bufsize=1
+            env=env
         )
-        
-        def read_client_output(stream, emitter):
-            for line in iter(stream.readline, ''):
-                logging.info(f"[Client] {line.strip()}")
-                emitter.emit_log(line.strip())
-            stream.close()
-            
-        threading.Thread(target=read_client_output, args=(self.client_process.stdout, self.client_emitter), daemon=True).start()
-        threading.Thread(target=read_client_output, args=(self.client_process.stderr, self.client_emitter), daemon=True).start()
+        self.watch_process(self.client_process, 'client', self.client_emitter)
         self.client_emitter.emit_log("客户端启动成功，开始加载模型...")
         
+    def watch_process(self, process, tag, emitter):
+        # 一个线程读取合并后的输出，另一个线程阻塞等待进程结束并通知界面
+        # 退出不能以管道关闭为准：子进程的子进程可能继承管道写端，主进程崩溃后管道仍未关闭
+        logger, prefix = PROCESS_LOGGERS[tag]
+        reader = threading.Thread(target=read_output, args=(process.stdout, emitter, logger, prefix), daemon=True)
+        reader.start()
+        def wait_process():
+            exit_code = process.wait()
+            # 稍等读取线程把最后的输出发出，使退出警告显示在其后
+            reader.join(timeout=EXIT_DRAIN_TIMEOUT)
+            self.process_exited.emit(tag, exit_code)
+        threading.Thread(target=wait_process, daemon=True).start()
 
-        
-        # 确保日志处理器只添加一次
-        if not any(isinstance(h, LogHandler) for h in logging.getLogger().handlers):
-            logging.getLogger().addHandler(LogHandler(self.client_log))
-        
-        try:
-            icon_path = get_icon_path()
-            if icon_path:
-                self.setWindowIcon(QIcon(icon_path))
-            else:
-                logging.warning("使用默认窗口图标")
-        except Exception as e:
-            logging.error(f"设置窗口图标失败：{str(e)}")
-        
-    def check_processes(self):
-        # 检查服务端进程状态
-        if self.server_process and self.server_process.poll() is not None:
-            exit_code = self.server_process.poll()
-            logging.error(f"服务端进程异常退出，退出码: {exit_code}")
-            if exit_code != 0:
-                self.server_log.append(f"警告：服务端进程异常退出，退出码: {exit_code}")
-                self.server_log.moveCursor(QTextCursor.End)
-
-        # 检查客户端进程状态
-        if self.client_process and self.client_process.poll() is not None:
-            exit_code = self.client_process.poll()
-            logging.error(f"客户端进程异常退出，退出码: {exit_code}")
-            if exit_code != 0:
-                self.client_log.append(f"警告：客户端进程异常退出，退出码: {exit_code}")
-                self.client_log.moveCursor(QTextCursor.End)
+    def on_process_exited(self, tag, exit_code):
+        # 经由缓冲区追加，保证警告显示在进程最后输出的日志之后
+        if tag == 'server':
+            name, append_log = "服务端", self.append_server_log
+        else:
+            name, append_log = "客户端", self.append_client_log
+        logging.error(f"{name}进程退出，退出码: {exit_code}")
+        if exit_code != 0:
+            append_log(f"警告：{name}进程异常退出，退出码: {exit_code}")
 
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == Qt.MouseButton.LeftButton:
-            self._drag_pos = event.globalPos() - self.pos()
+            gp = event.globalPos()
+            self._drag_x = gp.x() - self.x()
+            self._drag_y = gp.y() - self.y()
             event.accept()
     
     def mouseMoveEvent(self, event: QMouseEvent):
-        if event.buttons() & Qt.MouseButton.LeftButton and self._drag_pos is not None:
-            self.move(event.globalPos() - self._drag_pos)
+        if event.buttons() & Qt.MouseButton.LeftButton and self._drag_x is not None:
+            gp = event.globalPos()
+            self._move_throttled(gp.x() - self._drag_x, gp.y() - self._drag_y)
             event.accept()
     
     def mouseReleaseEvent(self, event: QMouseEvent):
         if event.button() == Qt.MouseButton.LeftButton:
-            self._drag_pos = None
+            self._drag_x = None
+            self._drag_y = None
             event.accept()
     
     def toggle_maximize(self):
@@ -379,115 +540,57 @@ class MainWindow(QMainWindow):
             except TypeError:
                 pass
         
-        # 停止进程监控
-        self.process_monitor.stop()
-        
-        # 终止服务器和客户端进程
-        if self.server_process:
-            try:
-                self.server_process.terminate()
-                self.server_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.server_process.kill()
-            except Exception as e:
-                logging.error(f"终止服务端进程时出错：{str(e)}")
-                
-        if self.client_process:
+        # 终止服务器和客户端进程，等待和强制结束放到后台线程，界面立即关闭
+        processes = [(name, process) for name, process in (("服务端", self.server_process), ("客户端", self.client_process)) if process]
+        for name, process in processes:
             try:
-                self.client_process.terminate()
-                self.client_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.client_process.kill()
+                process.terminate()
             except Exception as e:
-                logging.error(f"终止客户端进程时出错：{str(e)}")
-        
-        # 检查并终止所有start_server.exe进程
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                if proc.info['name'] == 'start_server.exe':
-                    psutil.Process(proc.info['pid']).terminate()
-                    logging.info(f"终止已存在的start_server.exe进程 (PID: {proc.info['pid']})")
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-                
+                logging.error(f"终止{name}进程时出错：{str(e)}")
+        # 非守护线程，主程序退出前会等待它清理完子进程
+        threading.Thread(target=shutdown_processes, args=(processes,)).start()
         event.accept()
 
 def start_core_server(log_emitter, window):
     # 记录当前工作目录和启动路径信息
-    current_dir = os.getcwd()
-    server_exe_path = os.path.join(BASE_DIR, "start_server.exe")
-    logging.info(f"当前工作目录: {current_dir}")
-    logging.info(f"服务器启动文件路径: {server_exe_path}")
-    
-    # 检查服务器可执行文件是否存在
-    if not os.path.exists(server_exe_path):
-        error_msg = f"错误：服务器可执行文件不存在: {server_exe_path}"
-        logging.error(error_msg)
-        log_emitter.emit_log(error_msg)
-        return
-    
-    # 检查文件权限
-    try:
-        with open(server_exe_path, 'rb') as _:
-            pass
-        logging.info("服务器可执行文件权限检查通过")
-    except PermissionError as e:
-        error_msg = f"错误：无法访问服务器可执行文件，权限不足: {str(e)}"
-        logging.error(error_msg)
-        log_emitter.emit_log(error_msg)
-        return
+    logging.info(f"当前工作目录: {os.getcwd()}")
+    logging.info(f"服务器启动文件路径: {SERVER_EXE}")
     
     # 在启动新进程前检查并清理已存在的start_server.exe进程
-    existing_processes = []
-    for proc in psutil.process_iter(['pid', 'name']):
-        try:
-            if proc.info['name'] == 'start_server.exe':
-                existing_processes.append(proc.info['pid'])
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    
-    if existing_processes:
-        logging.info(f"发现{len(existing_processes)}个已存在的服务器进程")
-        for pid in existing_processes:
-            try:
-                psutil.Process(pid).terminate()
-                logging.info(f"已终止服务器进程 (PID: {pid})")
-            except Exception as e:
-                logging.warning(f"终止进程 {pid} 时出错: {str(e)}")
+    kill_orphan_servers()
     
     logging.info("准备启动服务器进程...")
-    command = [os.path.join(BASE_DIR, "start_server.exe")]
+    command = [SERVER_EXE]
     logging.info(f"启动命令: {' '.join(command)}")
     log_emitter.emit_log("正在启动服务器进程...")
     
+    # 输出按UTF-8解码，需让子进程以UTF-8写管道，否则会按系统ANSI代码页输出
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf8'
     try:
         window.server_process = subprocess.Popen(
             command,  # 直接运行exe
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
+            stderr=subprocess.STDOUT,
             creationflags=subprocess.CREATE_NO_WINDOW,
-            bufsize=1
+            env=env
         )
         success_msg = f"服务器进程已启动，PID: {window.server_process.pid}"
         logging.info(success_msg)
         log_emitter.emit_log(success_msg)
+    except FileNotFoundError:
+        # 不再预先检查文件是否存在，由Popen直接报告
+        error_msg = f"错误：服务器可执行文件不存在: {SERVER_EXE}"
+        logging.error(error_msg)
+        log_emitter.emit_log(error_msg)
+        return
     except Exception as e:
         error_msg = f"启动服务器进程失败: {str(e)}"
         logging.error(error_msg)
         log_emitter.emit_log(error_msg)
         return
     
-    def read_output(stream, emitter):
-        for line in iter(stream.readline, ''):
-            logging.info(f"[Core Server] {line.strip()}")
-            emitter.emit_log(line.strip())
-        stream.close()
-    
-    threading.Thread(target=read_output, args=(window.server_process.stdout, log_emitter), daemon=True).start()
-    threading.Thread(target=read_output, args=(window.server_process.stderr, log_emitter), daemon=True).start()
-    
-    window.server_process.wait()
+    window.watch_process(window.server_process, 'server', log_emitter)
 
 def main():
     try:
@@ -498,27 +601,21 @@ def main():
 
         app = QApplication(sys.argv)
         app.setQuitOnLastWindowClosed(False)
-        app.setStyleSheet("""
-            QApplication {
-                background-color: #121212;
-                color: #e0e0e0;
-            }
-            QMenu {
-                background-color: #1e1e1e;
-                color: #e0e0e0;
-                border: 1px solid #333;
-            }
-            QMenu::item:selected {
-                background-color: #333;
-            }
-            QAction {
-                color: #e0e0e0;
-            }
-        """)
+        app.setStyleSheet(_APP_QSS + _TITLEBAR_QSS + _CONTENT_QSS)
         logging.info("应用程序初始化成功")
         
+        # 图标只解码一次，托盘和主窗口共用
+        if icon_path:
+            icon = QIcon(icon_path)
+            if icon.isNull():
+                logging.error(f"无法加载图标文件：{icon_path}")
+                icon = QIcon()
+        else:
+            icon = QIcon()
+        
         # 启动core_server
         window = MainWindow()
+        window.setWindowIcon(icon)
         server_thread = threading.Thread(
             target=start_core_server,
             args=(window.server_emitter, window),
@@ -533,14 +630,6 @@ def main():
             sys.exit(1)
 
         tray = QSystemTrayIcon()
-        if icon_path:
-            icon = QIcon(icon_path)
-            if icon.isNull():
-                logging.error(f"无法加载图标文件：{icon_path}")
-                icon = QIcon()
-        else:
-            icon = QIcon()
-            
         tray.setIcon(icon)
         tray.setToolTip("CapsWriter-Offline")
         logging.info("系统托盘图标初始化成功")